@@ -9,10 +9,26 @@ Date: 03.10.2023
 Version: 1.0
 """
 
-import cv2
 import os
+
+# Allow FFMPEG to pick a hardware decoder (VAAPI/CUDA). Must be set before cv2 is imported.
+os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', 'hw_decoders_any;vaapi,cuda')
+
+import concurrent.futures
+import cv2
+import json
+import multiprocessing
+import numpy as np
+import platform
+import queue
+import re
+import signal
+import subprocess
+import threading
 import time
 import tkinter as tk
+from multiprocessing import shared_memory
+from pathlib import Path
 from tkinter import ttk
 
 
@@ -20,16 +36,65 @@ from tkinter import ttk
 sensitivity = 700  # Motion Detection Sensitivity
 recording_duration = 30  # Recording Duration in seconds after motion detection
 output_folder = 'recordings'  # Folder for Recordings
+detection_downscale = 4  # Motion detection runs on a frame downscaled by this factor (1 = full resolution)
+
+# Preconstructed path for building recording filenames (os.path.join semantics, works on Windows too)
+_output_path = Path(output_folder)
+
+# Cache file for resolutions discovered in earlier sessions, keyed by camera index and backend
+_resolution_cache_file = Path.home() / '.cache' / 'camera_motion_recorder' / 'resolutions.json'
 
 # Variables
 motion_detected = False
-motion_detected_realtime = False
-last_motion_time = None
-recording_start_time = None
-current_time = None
-video_out = None
+video_out = None  # Owned by the encoder process while it is running
+
+# Codec decision cached after the first successful recording of the session
+_chosen_fourcc = None
+_chosen_extension = None
+_chosen_hw_acceleration = False
 recording_number = 1
 
+# Frame-difference gate kernel. Numba compiles it to parallel native code when available;
+# otherwise an equivalent NumPy expression is used.
+try:
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _diff_count(prev, cur, threshold):
+        count = 0
+        for i in prange(prev.shape[0]):
+            for j in range(prev.shape[1]):
+                if abs(int(prev[i, j]) - int(cur[i, j])) > threshold:
+                    count += 1
+        return count
+
+    _numba_available = True
+except ImportError:
+    def _diff_count(prev, cur, threshold):
+        return int(np.count_nonzero(cv2.absdiff(prev, cur) > threshold))
+
+    _numba_available = False
+
+# 3x3 structuring element for denoising the foreground mask of the KNN fallback
+_noise_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+# Reusable frame-sized scratch buffers for display_information (allocated once the resolution is known)
+_overlay_buf = None
+_out_buf = None
+
+# Cached clock string - time.strftime is only re-evaluated when the second changes
+_time_cache = {"t": 0, "s": ""}
+
+# Cached text sprites - re-rasterized only when one of the displayed strings changes
+_text_cache_key = None
+_ui_sprite = None  # Status and recording texts for the live view (upper left corner)
+_ui_mask = None
+_out_sprite = None  # Recording texts for the video file (upper left corner)
+_out_mask = None
+_time_sprite = None  # Date and time (upper right corner, identical on both frames)
+_time_mask = None
+_time_sprite_x = 0
+
 
 # Function to create the Tkinter window and select the camera
 def create_camera_selection_window():
@@ -60,21 +125,42 @@ def create_camera_selection_window():
         available_cameras = [] # List for storing camera information
         camera_indices = []  # List for storing camera indices
 
-        for index in range(num_cameras):
+        def probe_camera(index):
+            """
+            Try to open a single camera index and read its backend name.
+
+            Returns:
+                tuple or None: A tuple (index, camera_info) if the camera could be opened, otherwise None.
+            """
+
             try:
-                cap = cv2.VideoCapture(index)
+                # On Linux, probing through V4L2 directly skips backends that would only fail slowly
+                if platform.system() == 'Linux':
+                    cap = cv2.VideoCapture(index, cv2.CAP_V4L2)
+                else:
+                    cap = cv2.VideoCapture(index)
                 if cap is None or not cap.isOpened():
                     print('Warning: unable to open video source: ', index)
+                    result = None
                 else:
                     # Trying to get the camera model
                     camera_info = cap.getBackendName()
                     if not camera_info:
                         camera_info = f"Camera"
-                    available_cameras.append(camera_info + " " + str(index))
-                    camera_indices.append(index)
+                    result = (index, camera_info + " " + str(index))
                 cap.release()
-            except cv2.error as e:
-                pass  # OpenCV-specific errors may occur during the search and are ignored.
+                return result
+            except cv2.error:
+                return None  # OpenCV-specific errors may occur during the search and are ignored.
+
+        # Probe all indices in parallel - each failed open can block for hundreds of milliseconds
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_cameras) as executor:
+            results = [result for result in executor.map(probe_camera, range(num_cameras)) if result is not None]
+
+        # Preserve the original ordering by camera index
+        for index, camera_info in sorted(results):
+            available_cameras.append(camera_info)
+            camera_indices.append(index)
 
         return available_cameras, camera_indices
 
@@ -149,15 +235,18 @@ def initialize_webcam(selected_camera_index):
             SystemExit: If the camera cannot be opened using any method.
         """
 
+    # Ask OpenCV for any available hardware-accelerated decoder
+    hw_acceleration_params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+
     # Initialize the camera with the V4L2-Backend
-    cap = cv2.VideoCapture(selected_camera_index, cv2.CAP_V4L2)  # (For Linux)
+    cap = cv2.VideoCapture(selected_camera_index, cv2.CAP_V4L2, hw_acceleration_params)  # (For Linux)
 
     # Check if the camera has been opened
     if not cap.isOpened():
         print("Error: Unable to open the camera with V4L2. Trying an alternative backend.")
 
         # Open the camera using a more general commane (for windows)
-        cap = cv2.VideoCapture(selected_camera_index)
+        cap = cv2.VideoCapture(selected_camera_index, cv2.CAP_ANY, hw_acceleration_params)
 
         # Check again if the camera has been opened
         if cap.isOpened():
@@ -166,6 +255,11 @@ def initialize_webcam(selected_camera_index):
             print(f"Error: Alternative method failed to open the camera ({selected_camera_index}). Exiting the program.")
             exit(1)
 
+    # Keep only a single frame in the driver's buffer queue so cap.read() always returns the
+    # freshest frame. Some backends silently ignore this, so log what was actually applied.
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    print(f"Capture buffer size: {int(cap.get(cv2.CAP_PROP_BUFFERSIZE))}")
+
     # Set the pixel format to MJPEG (if supported)
     cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
 
@@ -179,15 +273,93 @@ def initialize_webcam(selected_camera_index):
     return cap
 
 
-def find_highest_resolution(cap):
+def _enum_v4l2_sizes(selected_camera_index):
+    """
+    Query the frame sizes supported by a V4L2 device directly from the driver.
+
+    This function asks v4l2-ctl for the supported frame sizes of the camera. Unlike set/get probing, this does not
+    reconfigure the device (each cap.set on V4L2 re-allocates the driver's buffer queue and takes hundreds of ms).
+
+    Args:
+        selected_camera_index (int): The index of the selected camera.
+
+    Returns:
+        list: A list of (width, height) tuples, or an empty list if the query failed (e.g. on Windows or when
+            v4l2-ctl is not installed).
+    """
+
+    try:
+        output = subprocess.check_output(
+            ['v4l2-ctl', '-d', f'/dev/video{selected_camera_index}', '--list-formats-ext'],
+            stderr=subprocess.DEVNULL, text=True)
+    except (OSError, subprocess.SubprocessError):
+        return []
+
+    return [(int(width), int(height)) for width, height in re.findall(r'Size: Discrete (\d+)x(\d+)', output)]
+
+
+def _load_cached_resolution(cache_key):
+    """
+    Look up a camera's resolution from the cache file of earlier sessions.
+
+    Args:
+        cache_key (str): The cache key identifying the camera.
+
+    Returns:
+        list or None: The cached [width, height], or None if the camera has no cache entry.
+    """
+
+    try:
+        with open(_resolution_cache_file) as cache_file:
+            return json.load(cache_file).get(cache_key)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_cached_resolution(cache_key, max_width, max_height):
+    """
+    Store a camera's discovered resolution in the cache file for later sessions.
+
+    Caching is best-effort: an unwritable cache directory is not an error.
+
+    Args:
+        cache_key (str): The cache key identifying the camera.
+        max_width (int): The discovered maximum width.
+        max_height (int): The discovered maximum height.
+    """
+
+    try:
+        cache = {}
+        if _resolution_cache_file.exists():
+            with open(_resolution_cache_file) as cache_file:
+                cache = json.load(cache_file)
+
+        cache[cache_key] = [max_width, max_height]
+
+        _resolution_cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(_resolution_cache_file, 'w') as cache_file:
+            json.dump(cache, cache_file)
+    except (OSError, ValueError):
+        pass
+
+
+def find_highest_resolution(cap, selected_camera_index):
     """
     Find the highest supported resolution for the camera.
 
-    This function determines the highest supported resolution for the camera by testing a list of resolutions in
-    descending order of quality.
+    This function first checks the cache of resolutions discovered in earlier sessions, then asks the V4L2 driver
+    for its supported frame sizes, which needs no device reconfiguration. If neither is possible, it falls back to
+    determining the highest supported resolution by testing a list of resolutions in descending order of quality.
+    Discovered resolutions are written back to the cache.
+
+    Whatever the source of the requested size, the returned values are read back from the driver after applying
+    them - V4L2 silently negotiates to the nearest size the device supports, and every downstream buffer is sized
+    from these values. A stale cache entry (e.g. a different camera on the same index) is overwritten with the
+    size the driver actually accepted.
 
     Args:
         cap (cv2.VideoCapture): The VideoCapture object for the camera.
+        selected_camera_index (int): The index of the selected camera.
 
     Returns:
         tuple: A tuple containing the maximum width and height for the supported resolution.
@@ -196,6 +368,42 @@ def find_highest_resolution(cap):
         This function modifies the camera's resolution settings.
     """
 
+    # Reuse the resolution discovered in an earlier session - every resolution switch on V4L2
+    # re-allocates the driver's buffers and makes some cameras visibly flicker
+    cache_key = f"{selected_camera_index}:{cap.getBackendName()}"
+    cached_size = _load_cached_resolution(cache_key)
+
+    if cached_size:
+        cached_width, cached_height = cached_size
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, cached_width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cached_height)
+
+        # Trust the driver over the cache - if another camera sits on this index now, V4L2
+        # silently negotiates to the nearest size it supports
+        max_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        max_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if (max_width, max_height) != (cached_width, cached_height):
+            print(f"Warning: Cached resolution {cached_width}x{cached_height} was not accepted by the camera. "
+                  f"Using {max_width}x{max_height} instead.")
+            _store_cached_resolution(cache_key, max_width, max_height)
+
+        return max_width, max_height
+
+    # Ask the driver directly - one query instead of repeated set/get probing
+    supported_sizes = _enum_v4l2_sizes(selected_camera_index)
+
+    if supported_sizes:
+        requested_width, requested_height = max(supported_sizes, key=lambda size: size[0] * size[1])
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, requested_width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, requested_height)
+
+        # Cache what the driver actually accepted, not what was asked for
+        max_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        max_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        _store_cached_resolution(cache_key, max_width, max_height)
+        return max_width, max_height
+
     # List of resolutions (in descending order of quality)
     resolutions_to_try = [
         (1920, 1080),  # Full HD
@@ -220,6 +428,9 @@ def find_highest_resolution(cap):
             max_height = height
             break
 
+    if max_width and max_height:
+        _store_cached_resolution(cache_key, max_width, max_height)
+
     return max_width, max_height
 
 
@@ -227,36 +438,34 @@ def initialize(max_width, max_height):
     """
     Initialize the motion detection parameters.
 
-    This function initializes the sensitivity and creates the background subtractor for motion detection. Sensitivity
-    is adjusted based on the camera resolution.
+    This function creates the output directory and adjusts the sensitivity based on the camera resolution. The
+    adjusted value is returned so that the caller can bind it to a local variable - the main loop reads it for
+    every frame, and a local read is cheaper than a module-global lookup.
 
     Args:
         max_width (int): The maximum width of the camera's resolution.
         max_height (int): The maximum height of the camera's resolution.
 
     Returns:
-        cv2.BackgroundSubtractorMOG2: The background subtractor object.
+        float: The resolution-adjusted motion detection sensitivity in pixels.
     """
 
-    global output_folder
-    global sensitivity
-
-    if not os.path.exists(output_folder):
+    if not _output_path.exists():
         try:
-            os.mkdir(output_folder)
+            _output_path.mkdir(parents=True)
             print(f"The directory {output_folder} has been created.")
         except OSError as e:
             print(f"Error creating the directory {output_folder}: {e}")
             exit(1)
 
     # Initialize sensitivity depending on resolution
-    sensitivity = sensitivity * (max_width * max_height) / (1280 * 720)  # Good parameters were determined using 720p
-    print(f"Resolution-adjusted sensitivity: {sensitivity} pixels")
+    adjusted_sensitivity = sensitivity * (max_width * max_height) / (1280 * 720)  # Good parameters were determined using 720p
 
-    # Initializing Background Subtraction
-    fgbg = cv2.createBackgroundSubtractorMOG2()
+    # Detection runs on a downscaled frame, so the area threshold shrinks accordingly
+    adjusted_sensitivity = adjusted_sensitivity / (detection_downscale * detection_downscale)
+    print(f"Resolution-adjusted sensitivity: {adjusted_sensitivity} pixels")
 
-    return fgbg
+    return adjusted_sensitivity
 
 
 def start_recording(video_name, max_width, max_height):
@@ -275,11 +484,31 @@ def start_recording(video_name, max_width, max_height):
         This function uses a global variable 'video_out' to store the VideoWriter object for recording.
         It supports the MKV and MP4 container formats.
 
-    Raises:
-        SystemExit: If video recording cannot be started with any container format or codec.
+    Returns:
+        bool: True if a VideoWriter was opened, False if no container format or codec works. This function runs
+            inside the encoder process, so the caller is responsible for reporting the failure to the main process.
     """
 
     global video_out
+    global _chosen_fourcc, _chosen_extension, _chosen_hw_acceleration
+
+    # Reuse the codec decision from the first successful recording - re-probing opens (and
+    # possibly fails) writers on every motion event for no reason
+    if _chosen_fourcc is not None:
+        video_file_name = f"{video_name}{_chosen_extension}"
+
+        if _chosen_hw_acceleration:
+            video_out = cv2.VideoWriter(video_file_name, cv2.CAP_FFMPEG, _chosen_fourcc, 20,
+                                        (max_width, max_height),
+                                        params=[cv2.VIDEOWRITER_PROP_HW_ACCELERATION,
+                                                cv2.VIDEO_ACCELERATION_ANY])
+        else:
+            video_out = cv2.VideoWriter(video_file_name, _chosen_fourcc, 20, (max_width, max_height))
+
+        if video_out.isOpened():
+            return True
+
+        print("Warning: The cached codec decision no longer works. Probing containers again.")
 
     # List of preferred container formats in desired order
     preferred_containers = ['MKV', 'MP4']
@@ -299,32 +528,121 @@ def start_recording(video_name, max_width, max_height):
         # Create filename with file extension
         video_file_name = f"{video_name}{file_extension}"
 
-        # Try to create the video file with the selected codec
-        video_out = cv2.VideoWriter(video_file_name, fourcc, 20, (max_width, max_height))
+        # Try to create the video file with a hardware-accelerated encoder first. ANY lets the
+        # FFMPEG backend pick whatever the machine offers (NVENC, VAAPI, QSV, V4L2 M2M).
+        video_out = cv2.VideoWriter(video_file_name, cv2.CAP_FFMPEG, fourcc, 20, (max_width, max_height),
+                                    params=[cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        hw_acceleration_used = video_out.isOpened()
+
+        # Fall back to the software encoder if no hardware encoder is available
+        if not hw_acceleration_used:
+            print(f"Hardware-accelerated encoding not available for {container_format}. "
+                  f"Falling back to software encoding.")
+            video_out = cv2.VideoWriter(video_file_name, fourcc, 20, (max_width, max_height))
 
         # Quit the loop if the video file was created successfully
         if video_out.isOpened():
             print(f"Video successfully created with container format: {container_format}")
+
+            # Remember the working combination for all further recordings in this session
+            _chosen_fourcc = fourcc
+            _chosen_extension = file_extension
+            _chosen_hw_acceleration = hw_acceleration_used
             break
         else:
             print(f"Error: Unable to create the video with container format: {container_format} "
                   f"and the associated codec.")
     else:
         print("Error: Unable to create a video file.")
-        exit(1)  # Exit the program if no container format works
+        return False  # The caller reports the failure to the main process
+
+    return True
+
 
+def _rasterize_text_sprites(current_time, motion_detected_realtime, recording_time_text, recording_number_text,
+                            max_width):
+    """
+    Render the overlay texts into small cached sprites.
+
+    Text rasterization with cv2.putText is not free at 30 FPS, but the displayed strings change at most once per
+    second. This function renders them into three small sprites (plus non-empty-pixel masks for blitting) which
+    display_information copies onto the frames until one of the strings changes again.
+
+    Args:
+        current_time (str): The formatted date and time string.
+        motion_detected_realtime (bool): Indicates whether motion is currently detected in real-time.
+        recording_time_text (str): The text indicating the recording duration.
+        recording_number_text (str): The text indicating the total number of recordings.
+        max_width (int): The maximum width of the camera's resolution.
+    """
+
+    global _text_cache_key
+    global _ui_sprite, _ui_mask
+    global _out_sprite, _out_mask
+    global _time_sprite, _time_mask, _time_sprite_x
+
+    if _ui_sprite is None:
+        _ui_sprite = np.zeros((100, 400, 3), dtype=np.uint8)
+        _out_sprite = np.zeros((100, 400, 3), dtype=np.uint8)
+    else:
+        _ui_sprite.fill(0)
+        _out_sprite.fill(0)
 
-def display_information(frame, contours, max_width, motion_detected_realtime, recording_time_text,
+    # Status and recording information for the live view
+    if motion_detected_realtime:
+        cv2.putText(_ui_sprite, "Motion detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+    else:
+        cv2.putText(_ui_sprite, "No motion detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    cv2.putText(_ui_sprite, recording_time_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(_ui_sprite, recording_number_text, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    # Informationen overlay in the Video
+    cv2.putText(_out_sprite, recording_time_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(_out_sprite, recording_number_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    # Date and time in the upper right corner
+    text_size = cv2.getTextSize(current_time, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+    _time_sprite = np.zeros((40, text_size[0] + 2, 3), dtype=np.uint8)
+    _time_sprite_x = max_width - text_size[0] - 10  # X-Position
+    cv2.putText(_time_sprite, current_time, (0, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    _ui_mask = _ui_sprite > 0
+    _out_mask = _out_sprite > 0
+    _time_mask = _time_sprite > 0
+
+    _text_cache_key = (current_time, motion_detected_realtime, recording_time_text, recording_number_text)
+
+
+def _blit_sprite(dst, sprite, mask, x, y):
+    """
+    Copy the non-empty pixels of a cached text sprite onto the frame at position (x, y).
+
+    Args:
+        dst (numpy.ndarray): The frame to copy the sprite onto.
+        sprite (numpy.ndarray): The cached text sprite.
+        mask (numpy.ndarray): Boolean mask of the sprite's non-empty pixels.
+        x (int): The x position of the sprite's upper left corner.
+        y (int): The y position of the sprite's upper left corner.
+    """
+
+    height = min(sprite.shape[0], dst.shape[0] - y)
+    width = min(sprite.shape[1], dst.shape[1] - x)
+    if height > 0 and width > 0:
+        np.copyto(dst[y:y + height, x:x + width], sprite[:height, :width], where=mask[:height, :width])
+
+
+def display_information(frame, motion_mask, max_width, motion_detected_realtime, recording_time_text,
                         recording_number_text):
     """
     Display information and motion detection status on the video frame.
 
     This function adds date and time, motion detection status, recording duration, and total recordings to the video frame.
-    It also highlights motion with contours.
+    It also highlights the areas where motion was detected.
 
     Args:
         frame (numpy.ndarray): The input video frame.
-        contours (list): A list of contours representing detected motion.
+        motion_mask (numpy.ndarray or None): Frame-sized mask whose non-zero pixels mark detected motion, or None
+            when no detection ran this frame.
         max_width (int): The maximum width of the camera's resolution.
         motion_detected_realtime (bool): Indicates whether motion is currently detected in real-time.
         recording_time_text (str): The text indicating the recording duration.
@@ -334,43 +652,172 @@ def display_information(frame, contours, max_width, motion_detected_realtime, re
         tuple: A tuple containing the frame for the video file and the frame for the user interface.
     """
 
-    outframe = frame.copy()
-    current_time = time.strftime("%d.%m.%Y %H:%M:%S")
+    global _overlay_buf
+    global _out_buf
 
-    # Date and time in the upper right corner
-    text_size = cv2.getTextSize(current_time, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-    text_x = max_width - text_size[0] - 10  # X-Position
-    text_y = 30  # Y-Position
-    cv2.putText(frame, current_time, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-    if motion_detected_realtime:
-        cv2.putText(frame, "Motion detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-    else:
-        cv2.putText(frame, "No motion detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-    cv2.putText(frame, recording_time_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-    cv2.putText(frame, recording_number_text, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    # Allocate the scratch buffers once and reuse them - this keeps the per-frame allocations at zero
+    if _out_buf is None or _out_buf.shape != frame.shape:
+        _overlay_buf = np.empty_like(frame)
+        _out_buf = np.empty_like(frame)
 
-    # Informationen overlay in the Video
-    cv2.putText(outframe, current_time, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    cv2.putText(outframe, recording_time_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-    cv2.putText(outframe, recording_number_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    np.copyto(_out_buf, frame)
+    outframe = _out_buf
 
-    # Draw the contours on the frame
-    # cv2.drawContours(frame, contours, -1, (0, 255, 0), 1)
+    # The clock string changes only once per second - skip the strftime call on all other frames
+    now = int(time.time())
+    if now != _time_cache["t"]:
+        _time_cache["t"] = now
+        _time_cache["s"] = time.strftime("%d.%m.%Y %H:%M:%S")
+    current_time = _time_cache["s"]
 
-    frame_with_transparency = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    # Re-rasterize the text sprites only when one of the strings changed (at most once per second)
+    if _text_cache_key != (current_time, motion_detected_realtime, recording_time_text, recording_number_text):
+        _rasterize_text_sprites(current_time, motion_detected_realtime, recording_time_text, recording_number_text,
+                                max_width)
 
-    cv2.drawContours(frame_with_transparency, contours, -1, (50, 255, 0, 0), -1)
+    # Blit the cached sprites onto the frames instead of re-rendering the texts every frame
+    _blit_sprite(frame, _ui_sprite, _ui_mask, 0, 0)
+    _blit_sprite(outframe, _out_sprite, _out_mask, 0, 0)
+    _blit_sprite(frame, _time_sprite, _time_mask, _time_sprite_x, 0)
+    _blit_sprite(outframe, _time_sprite, _time_mask, _time_sprite_x, 0)
 
-    # Convert the background frame to BGRA
-    background_frame_with_alpha = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    # Colorize the motion areas in the reusable overlay buffer and blend in-place.
+    # Blending plain BGR frames gives the same result as the former BGRA path without the two conversions.
+    if motion_mask is not None:
+        np.copyto(_overlay_buf, frame)
+        _overlay_buf[motion_mask > 0] = (50, 255, 0)
 
-    alpha = 0.25
-    frame = cv2.addWeighted(frame_with_transparency, alpha, background_frame_with_alpha, 1 - alpha, 0)#
+        alpha = 0.25
+        cv2.addWeighted(_overlay_buf, alpha, frame, 1 - alpha, 0, dst=frame)
 
     return frame, outframe  # Return the frames for the video file and the user interface
 
 
+def capture_loop(cap, frame_queue, stop_event):
+    """
+    Continuously read frames from the camera and push them into a bounded queue.
+
+    This function runs in a dedicated thread so that capturing is never stalled by processing, encoding or the user
+    interface. Every frame is grabbed to keep the driver's buffer queue advancing, but it is only retrieved (i.e.
+    decoded) and queued while the consumer has no frame pending. Frames arriving faster than the consumer can
+    process are skipped before decoding, so the consumer always receives a fresh frame and latency stays bounded.
+
+    Args:
+        cap (cv2.VideoCapture): The VideoCapture object for the opened camera.
+        frame_queue (queue.Queue): The bounded queue that frames are pushed into.
+        stop_event (threading.Event): Event that signals the thread to stop.
+    """
+
+    while not stop_event.is_set():
+        # Advance the driver's frame queue without decoding
+        if not cap.grab():
+            break
+
+        # Only decode the frame when the consumer is ready for a new one
+        if frame_queue.qsize() > 0:
+            continue
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+
+        # Cannot block: this thread is the only producer and the queue held at most one frame above
+        frame_queue.put_nowait(frame)
+
+    stop_event.set()  # Tell the main loop that the camera has stopped delivering frames
+
+
+def display_loop(display_queue, stop_event):
+    """
+    Show frames in the preview window from a dedicated thread.
+
+    This function consumes annotated frames from a bounded queue so that a slow GUI blit cannot stall the processing
+    loop. It owns the window and the keyboard polling: when the user presses q or ESC, it sets the stop event that
+    shuts the whole pipeline down.
+
+    Args:
+        display_queue (queue.Queue): The bounded queue that annotated frames are consumed from.
+        stop_event (threading.Event): Event that signals the thread to stop (and is set on user exit).
+    """
+
+    while not stop_event.is_set():
+        try:
+            frame = display_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+
+        cv2.imshow('CMDR - Press q to exit', frame)
+
+        # pollKey pumps the GUI event loop without waitKey's forced sleep. The window only
+        # repaints while events are processed, so it must run for every imshow - skipping it
+        # would just throw the blit away.
+        key = cv2.pollKey() & 0xFF
+        if key == ord('q') or key == 27:  # ASCII-Code für "ESC"
+            stop_event.set()
+
+    cv2.destroyAllWindows()
+
+
+def encoder_loop(command_queue, free_slots, shm_names, frame_shape):
+    """
+    Encode and write video frames in a dedicated process.
+
+    This function runs in a separate process that owns the cv2.VideoWriter, so H.264 encoding runs on its own core
+    outside the main process' GIL. Frames are handed over through a small ring of shared-memory blocks: the main
+    process copies a frame into a free slot (one memcpy), and this side writes it to the video file with no further
+    copies. Finished slots are returned through the free_slots queue. When a recording cannot be started with any
+    container format, the sentinel -1 is returned instead of a slot so the main process notices the failure.
+
+    Commands on command_queue:
+        ("start", video_name, max_width, max_height): Begin a new recording.
+        ("frame", slot_index): Write the frame stored in the given shared-memory slot.
+        ("stop",): Finish the current recording.
+        None: Shut the encoder process down.
+
+    Args:
+        command_queue (multiprocessing.Queue): The queue that commands are consumed from.
+        free_slots (multiprocessing.Queue): The queue that finished slot indices are returned to.
+        shm_names (list): The names of the shared-memory blocks forming the frame ring.
+        frame_shape (tuple): The (height, width, channels) shape of a video frame.
+    """
+
+    global video_out
+
+    # Ctrl-C is delivered to the whole foreground process group. Ignore it here - otherwise the
+    # KeyboardInterrupt kills this process inside command_queue.get() before video_out.release(),
+    # leaving the recording in progress unplayable. The parent's ("stop",) and None sentinels
+    # remain the only shutdown path.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    shm_blocks = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    shm_frames = [np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf) for shm in shm_blocks]
+
+    while True:
+        command = command_queue.get()
+        if command is None:
+            break
+
+        if command[0] == "start":
+            _, video_name, max_width, max_height = command
+            if not start_recording(video_name, max_width, max_height):
+                free_slots.put(-1)  # Report the failure - exiting here would only kill this process silently
+        elif command[0] == "frame":
+            slot = command[1]
+            if video_out is not None:
+                video_out.write(shm_frames[slot])
+            free_slots.put(slot)
+        elif command[0] == "stop":
+            if video_out is not None:
+                video_out.release()
+                video_out = None
+
+    if video_out is not None:
+        video_out.release()
+
+    for shm in shm_blocks:
+        shm.close()
+
+
 def main():
     """
     The main function that controls the camera motion detection and recording process.
@@ -384,7 +831,13 @@ def main():
 
     global motion_detected
     global recording_number
-    global video_out
+
+    # Configure OpenCV's internal parallel_for_ pool explicitly: keep one core free for the
+    # capture and display threads, and make sure the SIMD-optimized kernels are enabled
+    cv2.setUseOptimized(True)
+    cpu_count = os.cpu_count() or 1
+    if cpu_count > 1:
+        cv2.setNumThreads(cpu_count - 1)
 
     selected_camera_index = create_camera_selection_window()
 
@@ -398,94 +851,274 @@ def main():
         print(f"Error opening camera {selected_camera_index}.")
         exit()
 
-    max_width, max_height = find_highest_resolution(cap)
+    max_width, max_height = find_highest_resolution(cap, selected_camera_index)
 
     if max_width == 0 or max_height == 0:
         print("Error: No supported resolution found.")
     else:
         print(f"Highest supported resolution: {max_width}x{max_height}")
 
-    initialize(max_width, max_height)
+    # Bind the adjusted sensitivity and the output path to locals - the loop reads them per frame
+    sensitivity = initialize(max_width, max_height)
+    out_path = _output_path
 
-    # Initialize Background Subtractor. Refer to README.md for information
-    fgbg = cv2.createBackgroundSubtractorKNN(history=20, dist2Threshold=800.0, detectShadows=False)
-    # fgbg = cv2.createBackgroundSubtractorMOG2(history=50, varThreshold=20, detectShadows=False)
+    # Run the whole subtraction pass on an NVIDIA GPU when OpenCV was built with CUDA support
+    use_cuda = hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    if use_cuda:
+        print("CUDA acceleration enabled for motion detection.")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # Otherwise let the T-API offload the detection chain (subtraction + denoising) via OpenCL
+    cv2.ocl.setUseOpenCL(True)
+    use_opencl = not use_cuda and cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+    if use_opencl:
+        print("OpenCL acceleration enabled for motion detection.")
 
-        # fgmask = fgbg.apply(frame)
-        fgmask = fgbg.apply(frame, learningRate=0.005)  # How quickly the background model adapts to frame changes
-
-        # Remove noise
-        fgmask = cv2.medianBlur(fgmask, 5)
-
-        # Increase contrast for edge detection
-        alpha = 1.5
-        beta = 0
-        fgmask = frame_contrast = cv2.convertScaleAbs(fgmask, alpha=alpha, beta=beta)
-
-        # Find contours
-        contours, _ = cv2.findContours(fgmask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        # Detect Motion
-        for contour in contours:
-            if cv2.contourArea(
-                    contour) > sensitivity:
-                if not motion_detected:
-                    motion_detected = True
-                    current_time = time.strftime("%d.%m.%y %H.%M.%S Uhr")
-                    video_name = f'{output_folder}/{current_time} - Recording {recording_number}'
-
-                    # Apply the maximum detected resolution for video recording
-                    start_recording(video_name, max_width, max_height)
-
-                    recording_start_time = time.time()
-                    print(f"{time.strftime('%H:%M:%S')} Recording {recording_number} started ({video_name})")
-                last_motion_time = time.time()
-                motion_detected_realtime = True
-                break
+    # Initialize Background Subtractor. Refer to README.md for information
+    # CNT is more than twice as fast as MOG2/KNN on low-end hardware and its pixel-stability logic
+    # already suppresses noise, so the extra denoising passes are only needed for the KNN fallback.
+    if use_cuda:
+        # The CUDA subtractor keeps the per-pixel mixture math on the GPU; its mask is denoised
+        # there as well, by a CUDA median filter when this build provides one
+        fgbg = cv2.cuda.createBackgroundSubtractorMOG2(detectShadows=False)
+        noise_removal_needed = False
+
+        gpu_frame = cv2.cuda_GpuMat()
+        gpu_denoised_mask = cv2.cuda_GpuMat()
+        gpu_stream = cv2.cuda_Stream()
+        if hasattr(cv2.cuda, 'createMedianFilter'):
+            gpu_median = cv2.cuda.createMedianFilter(cv2.CV_8UC1, 5)
+        else:
+            gpu_median = None
+    elif hasattr(cv2, 'bgsegm'):
+        fgbg = cv2.bgsegm.createBackgroundSubtractorCNT(minPixelStability=15, useHistory=True,
+                                                        maxPixelStability=15 * 60, isParallel=True)
+        noise_removal_needed = False
+    else:
+        print("Warning: cv2.bgsegm not available (requires opencv-contrib). Falling back to KNN.")
+        # A short history halves the per-pixel sample set the model keeps (and re-reads every
+        # frame); together with the grayscale input the working set fits much better in cache
+        fgbg = cv2.createBackgroundSubtractorKNN(history=8, dist2Threshold=800.0, detectShadows=False)
+        # fgbg = cv2.createBackgroundSubtractorMOG2(history=50, varThreshold=20, detectShadows=False)
+        noise_removal_needed = True
+
+    # Cheap first-stage motion gate: a tiny grayscale difference decides whether the full
+    # background subtraction needs to run at all this frame
+    gate_size = (160, 90)
+    gate_pixel_threshold = 20  # Minimum brightness change for a gate pixel to count as changed
+    gate_count_threshold = 10  # Number of changed gate pixels needed to run the full detection
+    prev_gate_frame = None
+
+    # Warm the JIT-compiled gate up once so the first real frame doesn't pay the compile cost
+    if _numba_available:
+        warmup_frame = np.zeros((gate_size[1], gate_size[0]), dtype=np.uint8)
+        _diff_count(warmup_frame, warmup_frame, gate_pixel_threshold)
+
+    # Preallocated scratch buffers - the per-frame OpenCV calls write into these via dst=
+    # instead of allocating fresh arrays 30 times per second
+    small_width = int(max_width / detection_downscale)
+    small_height = int(max_height / detection_downscale)
+    small_buf = np.empty((small_height, small_width, 3), dtype=np.uint8)
+    small_gray_buf = np.empty((small_height, small_width), dtype=np.uint8)
+    fgmask_buf = np.empty((small_height, small_width), dtype=np.uint8)
+    gate_color_buf = np.empty((gate_size[1], gate_size[0], 3), dtype=np.uint8)
+    motion_mask_buf = np.empty((max_height, max_width), dtype=np.uint8)
+
+    # Two gray gate buffers are ping-ponged because the previous gate frame must stay valid
+    gate_gray_bufs = (np.empty((gate_size[1], gate_size[0]), dtype=np.uint8),
+                      np.empty((gate_size[1], gate_size[0]), dtype=np.uint8))
+
+    motion_detected_realtime = False
+    motion_mask = None
+
+    # Encoding runs in its own process; frames are handed over through a small ring of
+    # shared-memory blocks, so the handoff costs one memcpy instead of pickling 6 MB per frame.
+    # The process is forked before any thread starts - forking a multithreaded process can
+    # leave locks held by a thread that does not exist in the child.
+    num_slots = 4
+    frame_shape = (max_height, max_width, 3)
+    shm_blocks = [shared_memory.SharedMemory(create=True, size=max_height * max_width * 3)
+                  for _ in range(num_slots)]
+    shm_frames = [np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf) for shm in shm_blocks]
+
+    command_queue = multiprocessing.Queue()
+    free_slots = multiprocessing.Queue()
+    for slot in range(num_slots):
+        free_slots.put(slot)
+
+    encoder_process = multiprocessing.Process(
+        target=encoder_loop,
+        args=(command_queue, free_slots, [shm.name for shm in shm_blocks], frame_shape),
+        daemon=True)
+    encoder_process.start()
+
+    # Decouple capturing and displaying from processing with bounded queues
+    frame_queue = queue.Queue(maxsize=2)
+    display_queue = queue.Queue(maxsize=2)
+    stop_event = threading.Event()
+
+    capture_thread = threading.Thread(target=capture_loop, args=(cap, frame_queue, stop_event), daemon=True)
+    capture_thread.start()
+
+    display_thread = threading.Thread(target=display_loop, args=(display_queue, stop_event), daemon=True)
+    display_thread.start()
+
+    # Shut down gracefully on Ctrl-C - the keyboard is polled less often now
+    def handle_sigint(signum, sigframe):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_sigint)
+
+    frame_index = 0
+    gate_index = 0
+    recording_end_time = 0
+    last_text_second = -1
+
+    while not stop_event.is_set():
+        try:
+            frame = frame_queue.get(timeout=1)
+        except queue.Empty:
+            if stop_event.is_set():
+                break  # The camera has stopped delivering frames
+            continue
+
+        # One monotonic clock read per frame - the whole recording state machine derives from it
+        now = time.monotonic()
+
+        # While no recording is active, detection only considers every 2nd frame - motion events
+        # last far longer than one frame interval, so the trigger latency is unaffected
+        if not motion_detected and (frame_index & 1):
+            run_detection = False
+        else:
+            # First stage: compare a tiny grayscale image against the previous one. Only when enough
+            # pixels changed does the (much more expensive) background subtraction run this frame.
+            cv2.resize(frame, gate_size, dst=gate_color_buf, interpolation=cv2.INTER_AREA)
+            gate_frame = gate_gray_bufs[gate_index & 1]
+            gate_index += 1
+            cv2.cvtColor(gate_color_buf, cv2.COLOR_BGR2GRAY, dst=gate_frame)
+
+            if prev_gate_frame is None:
+                run_detection = True
             else:
-                motion_detected_realtime = False
+                changed_pixels = _diff_count(prev_gate_frame, gate_frame, gate_pixel_threshold)
+                run_detection = changed_pixels >= gate_count_threshold
+
+            prev_gate_frame = gate_frame
+
+        if run_detection:
+            # Run motion detection on a downscaled frame - coarse blobs are all the area threshold needs,
+            # and background subtraction moves far fewer bytes this way
+            cv2.resize(frame, (small_width, small_height), dst=small_buf, interpolation=cv2.INTER_AREA)
+
+            # The motion decision only uses blob areas, never color - a single-channel input cuts
+            # the background model's per-pixel work and memory traffic by three
+            cv2.cvtColor(small_buf, cv2.COLOR_BGR2GRAY, dst=small_gray_buf)
+            small = small_gray_buf
+
+            # How quickly the background model adapts to frame changes: learningRate=0.005
+            if use_cuda:
+                # Upload once, subtract and denoise on the GPU, download only the final mask
+                gpu_frame.upload(small, gpu_stream)
+                gpu_fgmask = fgbg.apply(gpu_frame, 0.005, gpu_stream)
+                if gpu_median is not None:
+                    gpu_median.apply(gpu_fgmask, gpu_denoised_mask, gpu_stream)
+                    gpu_fgmask = gpu_denoised_mask
+                gpu_stream.waitForCompletion()
+                fgmask = gpu_fgmask.download()
+            elif use_opencl:
+                # Keep the whole chain on the GPU and download only the final mask for the contours
+                ufgmask = fgbg.apply(cv2.UMat(small), learningRate=0.005)
+                if noise_removal_needed:
+                    ufgmask = cv2.morphologyEx(ufgmask, cv2.MORPH_OPEN, _noise_kernel)
+                fgmask = ufgmask.get()
+            else:
+                fgmask = fgbg.apply(small, fgmask_buf, 0.005)
+
+                if noise_removal_needed:
+                    # Remove noise: one morphological opening replaces the former medianBlur and
+                    # convertScaleAbs passes - a single in-place image pass instead of three
+                    fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, _noise_kernel, dst=fgmask)
+
+            # Detect Motion - connected-component labelling returns all blob areas as one NumPy
+            # vector in a single C++ pass, replacing contour tracing plus per-contour area calls
+            nlabels, labels, stats, centroids = cv2.connectedComponentsWithStats(fgmask, connectivity=8,
+                                                                                 ltype=cv2.CV_16U)
+            areas = stats[1:, cv2.CC_STAT_AREA]  # Row 0 is the background label
+            motion_detected_realtime = bool((areas > sensitivity).any())
+
+            # Upscale the foreground mask for the overlay (its non-zero pixels are the motion areas)
+            cv2.resize(fgmask, (max_width, max_height), dst=motion_mask_buf,
+                       interpolation=cv2.INTER_NEAREST)
+            motion_mask = motion_mask_buf
+        else:
+            # The scene is static - video writing and display still happen below
+            motion_detected_realtime = False
+            motion_mask = None
 
-        # Check for inactivity
-        if motion_detected:
-            recording_time = time.time() - last_motion_time
-            recording_time_s = int(time.time() - recording_start_time)
-            recording_time_text = time.strftime("Duration: %M:%S", time.gmtime(recording_time_s))
-            recording_number_text = f"Total recordings: {recording_number}"
+        if motion_detected_realtime:
+            if not motion_detected:
+                motion_detected = True
+                current_time = time.strftime("%d.%m.%y %H.%M.%S Uhr")
+                video_name = str(out_path / f'{current_time} - Recording {recording_number}')
 
-            if recording_time >= recording_duration:
-                print(f"Recording {recording_number} completed")
-                video_out.release()
+                # Apply the maximum detected resolution for video recording
+                command_queue.put(("start", video_name, max_width, max_height))
 
-                if not video_out.isOpened():
-                    print(f"Error: Could not finish recording: {video_name}")
+                recording_start_time = now
+                print(f"{time.strftime('%H:%M:%S')} Recording {recording_number} started ({video_name})")
 
-                video_out = None
+            # The recording runs until no motion has been seen for recording_duration seconds
+            recording_end_time = now + recording_duration
+
+        # Check for inactivity
+        if motion_detected:
+            # The duration texts change at most once per second
+            if int(now) != last_text_second:
+                last_text_second = int(now)
+                recording_time_s = int(now - recording_start_time)
+                recording_time_text = time.strftime("Duration: %M:%S", time.gmtime(recording_time_s))
+                recording_number_text = f"Total recordings: {recording_number}"
+
+            if now >= recording_end_time:
+                print(f"Recording {recording_number} completed")
+                command_queue.put(("stop",))
                 motion_detected = False
                 recording_number += 1
 
-        frame, outframe = display_information(frame, contours, max_width, motion_detected_realtime,
+        frame, outframe = display_information(frame, motion_mask, max_width, motion_detected_realtime,
                                               recording_time_text, recording_number_text)
 
-        if video_out is not None:
-            video_out.write(outframe)
+        if motion_detected:
+            try:
+                slot = free_slots.get_nowait()
+                if slot < 0:
+                    # The encoder process could not create a video file with any container format
+                    print("Error: Unable to create a video file. Exiting the program.")
+                    stop_event.set()
+                    break
+                np.copyto(shm_frames[slot], outframe)
+                command_queue.put(("frame", slot))
+            except queue.Empty:
+                pass  # All slots busy - drop the frame rather than stalling behind a slow encoder
 
-        cv2.imshow('CMDR - Press q to exit', frame)
+        try:
+            display_queue.put_nowait(frame)
+        except queue.Full:
+            pass  # Drop the preview frame - detection and recording stay real-time
 
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q') or key == 27:  # ASCII-Code für "ESC"
-            break
+        frame_index += 1
 
     # Clean up and quit
-    if video_out is not None:
-        video_out.release()
+    stop_event.set()
+    command_queue.put(None)  # Signal the encoder process to stop
+    capture_thread.join(timeout=2)
+    display_thread.join(timeout=2)  # The display thread destroys the window on its way out
+    encoder_process.join(timeout=5)
+
+    for shm in shm_blocks:
+        shm.close()
+        shm.unlink()
 
     cap.release()
-    cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":